@@ -1,4 +1,4 @@
-import time, collections, gc, asyncio, vfs, os
+import time, gc, asyncio, vfs, os, sys
 from alt_micropyGPS import MicropyGPS
 from machine import Pin, UART, I2C, SPI
 import ssd1306, sdcard
@@ -10,24 +10,36 @@ micropython.alloc_emergency_exception_buf(100)
 __str_array = const(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ') #For GridLocator Calc
 
 # Lock And EventFlag for asyncio
-gnss_newchar = asyncio.Event()
 gnss_logstart = asyncio.Event()
 gnss_logstop = asyncio.Event()
 gnss_logstopped = asyncio.Event()
-readbuf_lock = asyncio.Lock()
 oled_lock = asyncio.Lock()
-gnss_updatenow = asyncio.Event()
+gnss_updatenow = asyncio.ThreadSafeFlag()
 pps_irq_flag = asyncio.ThreadSafeFlag()
 logging_stop_flag = asyncio.ThreadSafeFlag()
 Card_Inserted = asyncio.Event()
 
 #datetime service variables
 td_jst_wDelay = datetime.timedelta(hours=9, seconds=1) # add 1sec Delay for display
+days_in_month = const(b'\x1f\x1c\x1f\x1e\x1f\x1e\x1f\x1f\x1e\x1f\x1e\x1f')
+jst_str = bytearray(b'000000 00:00:00') # YYMMDD hh:mm:ss, rewritten by datetime_toJST
 
 # Running Mode Config
 config_atFirst = False
 uart_outputnmea = False
 
+# GNSS Reciever Config, sent at once when config_atFirst
+gnss_config_cmd = (
+    b'$PSTMCFGCONST,2,2,2,2,0*01\r\n' # Set Positioning Constelation to GPS+GLONASS+GALILEO+QZSS
+    b'$PSTMSBASSERVICE,15*6C\r\n' # Set SBAS Service Auto
+    b'$PSTMSTAGPSSETCONSTMASK,3*14\r\n' # Use STAGPS for GPS and GLONASS
+    b'$PSTMSTAGPSONOFF,1*4B\r\n' # Use STAGPS Autonomous AGPS
+    b'$PSTMSETPAR,1200,4,1*31\r\n' # Use SBAS Service
+    b'$PSTMSETPAR,1200,80000,1*3D\r\n' # GSV sentence talker ID change to GN Only
+    b'$PSTMSAVEPAR*58\r\n' # Save Parameters
+    b'$PSTMSRR*49\r\n' # Software Reset
+)
+
 #Tweak MicropyGPS GSV Parser
 MicropyGPS.supported_sentences['GNGSV'] = MicropyGPS.gpgsv
 
@@ -53,99 +65,117 @@ status_led.value(0)
 # global variables
 logfile_str = ''
 sg = bytearray(8)
+lat_str = bytearray(b"Lat:  0 00.000'N")
+lon_str = bytearray(b"Lon:  0 00.000'E")
 
-async def uart_readgnss(uart: UART,buf: collections.deque):
-    while True:
-        if uart.any():
-            s = uart.read()
-            if s is not None:
-                await readbuf_lock.acquire()
-                buf.extend(bytearray(s))
-                readbuf_lock.release()
-                gnss_newchar.set()
-                if uart_outputnmea:
-                    try:
-                        str_utf = str(s, 'UTF-8', "")
-                        print(str_utf, end="")
-                    except Exception as e:
-                        print(e)
-
-        await asyncio.sleep(0)
-
-async def gnss_update(gnss: MicropyGPS, buf: collections.deque):
+async def gnss_update(uart: UART, gnss: MicropyGPS):
     global logfile_str
+    sreader = asyncio.StreamReader(uart) # wait on UART poll instead of busy checking uart.any()
+    rxbuf = bytearray(512)
+    rxbuf_mv = memoryview(rxbuf)
+    # Feed the read buffer at once if the parser has update_bytes(), byte by byte otherwise
+    update_bytes = getattr(gnss, 'update_bytes', None)
     while True:
-        await gnss_newchar.wait()
-        await readbuf_lock.acquire()
+        n = await sreader.readinto(rxbuf)
+        if not n:
+            continue
+        s = rxbuf_mv[:n]
         if gnss_logstop.is_set():
             gnss.stop_logging()
             gnss_logstop.clear()
             gnss_logstopped.set()
             print('logging stopped')
-        while len(buf) != 0:
-            gnss.update(chr(buf.popleft()))
+        if update_bytes is not None:
+            update_bytes(rxbuf, n)
+        else:
+            for c in s:
+                gnss.update(chr(c)) # alt_micropyGPS takes a 1-char str
         if gnss_logstart.is_set():
             gnss.start_logging(logfile_str, mode='new')
             print(f'Logging Start with filename {logfile_str}')
             gnss_logstart.clear()
         gnss_updatenow.set()
-        gnss_newchar.clear()
-        readbuf_lock.release()
-
-def lat_lon_string(lat_lon):
-    min = "'"
+        if uart_outputnmea:
+            sys.stdout.buffer.write(s) # raw bytes, no decode
+
+@micropython.native
+def lat_lon_fmt(out:bytearray, pos:int, d:int, dm_milli:int, hemi:int):
+    # write 'DDD MM.MMM'H' to out[pos:pos+12], leading zeros of degree are blank
+    out[pos] = 0x30 + d // 100 if d >= 100 else 0x20
+    out[pos+1] = 0x30 + d // 10 % 10 if d >= 10 else 0x20
+    out[pos+2] = 0x30 + d % 10
+    out[pos+4] = 0x30 + dm_milli // 10000
+    out[pos+5] = 0x30 + dm_milli // 1000 % 10
+    out[pos+7] = 0x30 + dm_milli // 100 % 10
+    out[pos+8] = 0x30 + dm_milli // 10 % 10
+    out[pos+9] = 0x30 + dm_milli % 10
+    out[pos+11] = hemi
+
+def lat_lon_string(lat_lon, out:bytearray):
     d, dm, hemi = lat_lon
-    return f'{d:3d} {dm:06.03f}{min}{hemi}'
-
+    lat_lon_fmt(out, 4, d, int(dm*1000 + 0.5), ord(hemi))
+    return out
+
+
+@micropython.viper
+def _gridlocator_kernel(sg: ptr8, lat_mm: int, lon_mm: int):
+    # lat_mm, lon_mm : latitude+90deg, longitude+180deg in 1/1000 minutes
+    sa = ptr8(__str_array)
+    sg[0] = sa[lon_mm // 1200000] # Field 20deg x 10deg
+    sg[1] = sa[lat_mm // 600000]
+    lon_mm = lon_mm % 1200000
+    lat_mm = lat_mm % 600000
+    sg[2] = lon_mm // 120000 + 0x30 # Square 2deg x 1deg
+    sg[3] = lat_mm // 60000 + 0x30
+    lon_mm = lon_mm % 120000
+    lat_mm = lat_mm % 60000
+    sg[4] = sa[lon_mm // 5000] # Subsquare 5min x 2.5min
+    sg[5] = sa[lat_mm // 2500]
+    lon_mm = lon_mm % 5000
+    lat_mm = lat_mm % 2500
+    sg[6] = lon_mm // 500 + 0x30 # Extended square 0.5min x 0.25min
+    sg[7] = lat_mm // 250 + 0x30
 
 def gridlocator_calc(lat, lon):
-    global sg
     d_lat, dm_lat, hemi = lat
     d_lon, dm_lon, hemi = lon
-    gf_lat = (d_lat + dm_lat/60 + 90)/10
-    gf_lon = (d_lon + dm_lon/60 + 180)/20
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[0] = __str_array[gf_lon_int]
-    sg[1] = __str_array[gf_lat_int]
-    gf_lat = (gf_lat - gf_lat_int)*10
-    gf_lon = (gf_lon - gf_lon_int)*10
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[2] = gf_lon_int + 0x30
-    sg[3] = gf_lat_int + 0x30
-    gf_lat = (gf_lat - gf_lat_int)*24
-    gf_lon = (gf_lon - gf_lon_int)*24
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[4] = __str_array[gf_lon_int]
-    sg[5] = __str_array[gf_lat_int]
-    gf_lat = (gf_lat - gf_lat_int)*10
-    gf_lon = (gf_lon - gf_lon_int)*10
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[6] = gf_lon_int + 0x30
-    sg[7] = gf_lat_int + 0x30
+    # Viper kernel has no tuple/float support, convert to integer 1/1000 minutes here
+    _gridlocator_kernel(sg, (d_lat + 90)*60000 + int(dm_lat*1000), (d_lon + 180)*60000 + int(dm_lon*1000))
     #print(str(sg, 'UTF-8'))
     return sg
 
-def datetime_toJST(gnss_date:tuple[int,int,int], timestamp:tuple[int, int, float], offset:datetime.timedelta):
-    #day = int(gnss_date[0])
-    #month = int(gnss_date[1])
-    #year = int(gnss_date[2])+2000
+def put_2digits(buf:bytearray, pos:int, value:int):
+    buf[pos] = 0x30 + value // 10
+    buf[pos+1] = 0x30 + value % 10
+
+def datetime_toJST(gnss_date:tuple[int,int,int], timestamp:tuple[int, int, float]):
+    # UTC+9h and 1sec Delay for display, same as td_jst_wDelay without datetime objects
+    day, month, year = gnss_date
     hour, minutes, seconds = timestamp
-    dt_now_jst = datetime.datetime(
-        int(gnss_date[2])+2000,
-        int(gnss_date[1]),
-        int(gnss_date[0]),
-        hour,minutes,int(seconds),0,
-        datetime.timezone.utc)+offset
-    
-    dateobj = dt_now_jst.date()
-    #datestr = f'{dateobj.year-2000:02d}{dateobj.month:02d}{dateobj.day:02d}'
-    timeobj = dt_now_jst.time()
-    dt_now_jst_str = f'{dateobj.year-2000:02d}{dateobj.month:02d}{dateobj.day:02d} {timeobj.hour:02d}:{timeobj.minute:02d}:{timeobj.second:02d}'
-    return dt_now_jst_str
+    seconds = int(seconds) + 1
+    if seconds == 60:
+        seconds = 0
+        minutes += 1
+        if minutes == 60:
+            minutes = 0
+            hour += 1
+    hour += 9
+    if hour >= 24:
+        hour -= 24
+        day += 1
+        if day > days_in_month[month-1] + (month == 2 and year % 4 == 0):
+            day = 1
+            month += 1
+            if month == 13:
+                month = 1
+                year = (year + 1) % 100
+    put_2digits(jst_str, 0, year)
+    put_2digits(jst_str, 2, month)
+    put_2digits(jst_str, 4, day)
+    put_2digits(jst_str, 7, hour)
+    put_2digits(jst_str, 10, minutes)
+    put_2digits(jst_str, 13, seconds)
+    return jst_str
 
 def datetime_toJST_filestr(gnss_date:tuple[int,int,int], timestamp:tuple[int, int, float], offset:datetime.timedelta):
     #day = int(gnss_date[0])
@@ -164,16 +194,54 @@ def datetime_toJST_filestr(gnss_date:tuple[int,int,int], timestamp:tuple[int, in
     dt_now_jst_str = f'{dateobj.year-2000:02d}{dateobj.month:02d}{dateobj.day:02d}_{timeobj.hour:02d}{timeobj.minute:02d}{timeobj.second:02d}.nmea'
     return dt_now_jst_str
 
-async def display_update(gnss: MicropyGPS, oled:ssd1306.SSD1306_I2C):
-    dt_now = '000000 00:00:00'
-    lat = '000 00.000''N'
-    lon = '000 00.000''E'
+class SSD1306_I2C_Partial(ssd1306.SSD1306_I2C):
+    # SSD1306 driver which can transfer a part of the pages (8px rows) of the buffer
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        super().__init__(width, height, i2c, addr, external_vcc)
+        self.buffer_mv = memoryview(self.buffer)
+
+    def show_pages(self, page_start, page_end):
+        self.write_cmd(ssd1306.SET_COL_ADDR)
+        self.write_cmd(0)
+        self.write_cmd(self.width - 1)
+        self.write_cmd(ssd1306.SET_PAGE_ADDR)
+        self.write_cmd(page_start)
+        self.write_cmd(page_end)
+        self.write_data(self.buffer_mv[page_start*self.width:(page_end+1)*self.width])
+
+# Last written text for each line of OLED, and range of the lines to be sent at next PPS
+oled_lines = ['']*8
+oled_dirty = [8, -1]
+
+def oled_line(oled:SSD1306_I2C_Partial, line:int, s:str, x:int = 0):
+    if s == oled_lines[line]:
+        return
+    oled.fill_rect(0, line*8, oled.width, 8, 0)
+    oled.text(s, x, line*8)
+    oled_lines[line] = s
+    if line < oled_dirty[0]:
+        oled_dirty[0] = line
+    if line > oled_dirty[1]:
+        oled_dirty[1] = line
+
+async def display_update(gnss: MicropyGPS, oled:SSD1306_I2C_Partial):
+    dt_now = jst_str
+    lat = lat_str
+    lon = lon_str
     gl = b'XX00XX00'
 
     fix_led.value(0)
     while True:
         await gnss_updatenow.wait()
-        if gnss.fix_type == 1:
+        # snapshot parser state, latitude/longitude are properties converted at each access
+        fix_type = gnss.fix_type
+        latitude = gnss.latitude
+        longitude = gnss.longitude
+        sat_in_use = gnss.satellites_in_use
+        sat_in_view = gnss.satellites_in_view
+        hdop = gnss.hdop
+        crc_fails = gnss.crc_fails
+        if fix_type == 1:
             fix_led.toggle()
         else:
             fix_led.value(1)
@@ -181,48 +249,38 @@ async def display_update(gnss: MicropyGPS, oled:ssd1306.SSD1306_I2C):
             #month = f'{gnss.date[1]:02d}'
             #year = f'{gnss.date[2]:02d}'
             #date_str = f'{gnss.date[2]:02d}/{gnss.date[1]:02d}/{gnss.date[0]:02d}'
-            lat = lat_lon_string(gnss.latitude)
-            lon = lat_lon_string(gnss.longitude)
-            gl = gridlocator_calc(gnss.latitude, gnss.longitude)
+            lat = lat_lon_string(latitude, lat_str)
+            lon = lat_lon_string(longitude, lon_str)
+            gl = gridlocator_calc(latitude, longitude)
             if gnss.valid:
-                dt_now = datetime_toJST(gnss.date,gnss.timestamp, td_jst_wDelay)
-        oled.fill(0)
+                dt_now = datetime_toJST(gnss.date,gnss.timestamp)
         #QZSS_prns = [x for x in gnss.satellites_used if x >= 184]
         await oled_lock.acquire()
-        oled.text(f'Lat:{lat}', 0, 0)
-        oled.text(f'Lon:{lon}', 0, 8)
-        oled.text(dt_now, 8, 16)
-        oled.text(f'FIX:{gnss.fix_type}  Sat:{gnss.satellites_in_use:02d}/{gnss.satellites_in_view:02d}',0,24)
-        oled.text(f'HDOP:{gnss.hdop: 2.1f}',0,32)
-        oled.text('GRID: '+str(gl, 'UTF-8'),0,40)
-        oled.text(f'CRC NG:{gnss.crc_fails: 9d}',0,48)
+        oled_line(oled, 0, str(lat, 'UTF-8'))
+        oled_line(oled, 1, str(lon, 'UTF-8'))
+        oled_line(oled, 2, str(dt_now, 'UTF-8'), 8)
+        oled_line(oled, 3, f'FIX:{fix_type}  Sat:{sat_in_use:02d}/{sat_in_view:02d}')
+        oled_line(oled, 4, f'HDOP:{hdop: 2.1f}')
+        oled_line(oled, 5, 'GRID: '+str(gl, 'UTF-8'))
+        oled_line(oled, 6, f'CRC NG:{crc_fails: 9d}')
         #oled.text(f'Elaps:{gnss.time_since_fix:10d}', 48,0)
-        oled.text(f'|   |',0, 56)
         if gnss.log_en is True:
-            oled.text(f'|Log|{gnss.log_charnum/1024: 9.1f}KB',0, 56)
+            oled_line(oled, 7, f'|Log|{gnss.log_charnum/1024: 9.1f}KB')
+        else:
+            oled_line(oled, 7, f'|   |')
         oled_lock.release()
-        gnss_updatenow.clear()
 
-async def display_sync(oled:ssd1306.SSD1306_I2C):
+async def display_sync(oled:SSD1306_I2C_Partial):
     while True:
         await pps_irq_flag.wait()
         await oled_lock.acquire()
-        oled.show()
+        if oled_dirty[1] >= 0:
+            oled.show_pages(oled_dirty[0], oled_dirty[1])
+            oled_dirty[0] = 8
+            oled_dirty[1] = -1
         oled_lock.release()
         pps_irq_flag.clear()
 
-async def gc_coro():
-    gc.enable()
-    while True:
-        gc.collect()
-        gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-        # for memory debug
-        #print("mem_alloc:", gc.mem_alloc())
-        #print("mem_free:", gc.mem_free())
-        #print("mem_info:")
-        #print(micropython.mem_info())
-        await asyncio.sleep(5)
-
 async def card_detect_and_loggingCtrl(gnss:MicropyGPS):
     global logfile_str
     while True:
@@ -231,7 +289,6 @@ async def card_detect_and_loggingCtrl(gnss:MicropyGPS):
             if gnss.fix_type == MicropyGPS.__FIX_3D and gnss.valid is True:
                 spi = SPI(1, baudrate=100_000, sck=Pin(10), mosi=Pin(11), miso=Pin(12))
                 sd = sdcard.SDCard(spi, Pin(15), baudrate=20_000_000)
-                await asyncio.sleep_ms(100)
                 vfs.mount(sd, '/sd')
                 os.chdir('sd')
                 if 'LOG' not in os.listdir('/sd'):
@@ -262,19 +319,18 @@ async def card_detect_and_loggingCtrl(gnss:MicropyGPS):
 
 async def gnss_read(uart: UART, gnss: MicropyGPS):
     gc.collect()
+    gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+    # for memory debug
+    #micropython.mem_info()
 
     i2c=I2C(1,sda=Pin(18),scl=Pin(19),freq=400000)
-    oled=ssd1306.SSD1306_I2C(128,64,i2c)
+    oled=SSD1306_I2C_Partial(128,64,i2c)
 
-    buf = collections.deque('', 1024*8) # When Logging function enabled, update processing will be shorting, then Exception has raised
-    uart.init(baudrate=9600, tx=Pin(0,Pin.OUT), rx=Pin(1, Pin.IN), timeout_char =16, rxbuf=1024*2)
     await asyncio.gather(
-        uart_readgnss(uart, buf),
-        gnss_update(gnss, buf),
+        gnss_update(uart, gnss),
         display_update(gnss, oled),
         display_sync(oled),
-        card_detect_and_loggingCtrl(gnss),
-        gc_coro()
+        card_detect_and_loggingCtrl(gnss)
     )
 
 
@@ -286,19 +342,12 @@ def main():
 
     time.sleep_ms(1000)
     
-    uart = UART(0, baudrate=9600, tx=Pin(0,Pin.OUT), rx=Pin(1, Pin.IN), timeout_char =16, rxbuf=255)
+    uart = UART(0, baudrate=9600, tx=Pin(0,Pin.OUT), rx=Pin(1, Pin.IN), timeout_char =16, rxbuf=1024*2)
 
     gnss_reciever = MicropyGPS()
 
     if config_atFirst: 
-        uart.write('$PSTMCFGCONST,2,2,2,2,0*01\r\n') # Set Positioning Constelation to GPS+GLONASS+GALILEO+QZSS
-        uart.write('$PSTMSBASSERVICE,15*6C\r\n') # Set SBAS Service Auto
-        uart.write('$PSTMSTAGPSSETCONSTMASK,3*14\r\n') # Use STAGPS for GPS and GLONASS
-        uart.write('$PSTMSTAGPSONOFF,1*4B\r\n') # Use STAGPS Autonomous AGPS
-        uart.write('$PSTMSETPAR,1200,4,1*31\r\n') # Use SBAS Service
-        uart.write('$PSTMSETPAR,1200,80000,1*3D\r\n') # GSV sentence talker ID change to GN Only
-        uart.write('$PSTMSAVEPAR*58\r\n') # Save Parameters
-        uart.write('$PSTMSRR*49\r\n') # Software Reset
+        uart.write(gnss_config_cmd)
         time.sleep_ms(200)
         if uart.any():
             s = uart.read()
@@ -31,11 +31,92 @@ try:
     # Assume running on MicroPython
     import utime
     get_ticks = utime.ticks_ms # get_ticks() (in milli second) used in fix_time.
+    ticks_diff = utime.ticks_diff
 except ImportError:
     # Otherwise default to time module for non-embedded implementations
-    # Should still support millisecond resolution.
-    import time
-    get_ticks = time.time
+    # Integer milli seconds of monotonic clock, same as ticks_ms() except wrapping around.
+    from time import monotonic_ns
+
+    def get_ticks():
+        return monotonic_ns() // 1000000
+
+    def ticks_diff(ticks1, ticks2):
+        return ticks1 - ticks2
+
+import sys
+from array import array
+
+# Hot paths are compiled to machine code by @micropython.native on MicroPython
+try:
+    import micropython
+except ImportError:
+    # Stand-in on CPython, decorated functions are run as plain Python
+    class micropython:
+        native = viper = staticmethod(lambda f: f)
+
+# _scan_segment(buf, pos, end, crc) -> int
+# Find the end of the segment (',' or '*') in buf[pos:end], returns its index or end if not found.
+# XOR of the bytes in the segment is accumulated into crc[0] (array('I')).
+# _find_byte(buf, c, pos, end) -> int
+# Same as buf.find(c, pos, end) for a byte value c, which bytearray of MicroPython does not have.
+if sys.implementation.name == 'micropython':
+    @micropython.viper
+    def _scan_segment(buf: ptr8, pos: int, end: int, crc: ptr32) -> int:
+        acc = int(crc[0])
+        while pos < end:
+            c = int(buf[pos])
+            if c == 44 or c == 42: # ',' or '*'
+                break
+            acc ^= c
+            pos += 1
+        crc[0] = acc
+        return pos
+
+    @micropython.viper
+    def _find_byte(buf: ptr8, c: int, pos: int, end: int) -> int:
+        while pos < end:
+            if int(buf[pos]) == c:
+                return pos
+            pos += 1
+        return -1
+else:
+    def _scan_segment(buf, pos, end, crc):
+        seg_end = buf.find(b',', pos, end)
+        star = buf.find(b'*', pos, end if seg_end < 0 else seg_end)
+        if star >= 0:
+            seg_end = star
+        elif seg_end < 0:
+            seg_end = end
+        crc[0] ^= MicropyGPS._nmea_xor(buf[pos:seg_end])
+        return seg_end
+
+    def _find_byte(buf, c, pos, end):
+        return buf.find(c, pos, end)
+
+# Values of ASCII hex digits for decoding received CRC, 0xFF for non hex digit bytes
+_HEX_DIGITS = bytearray(b'\xff' * 256)
+for _i in range(16):
+    _HEX_DIGITS[b'0123456789ABCDEF'[_i]] = _i
+    _HEX_DIGITS[b'0123456789abcdef'[_i]] = _i
+
+# Values of cleared or undefined data, shared by parsers without attribute lookups
+_NAN = float('nan')
+_CLEAR_DATE = (0, 0, 0)
+_CLEAR_TIME = (0, 0, 0.0)
+_CLEAR_LAT = (0, 0.0, 'N')
+_CLEAR_LON = (0, 0.0, 'W')
+_SV_NONE = -32768 # No value in satellite data arrays
+_HEMI_SIGN = {'N': 1, 'E': 1, 'S': -1, 'W': -1} # Signs of coordinates in dd format
+
+# Classes of ASCII chars for update(), 0 for non printable chars to be skipped
+_CH_TEXT, _CH_DOLLAR, _CH_COMMA, _CH_STAR = 1, 2, 3, 4
+_CHAR_CLASS = bytearray(128)
+for _i in range(32, 127): # Printable chars
+    _CHAR_CLASS[_i] = _CH_TEXT
+_CHAR_CLASS[10] = _CHAR_CLASS[13] = _CH_TEXT # LF, CR
+_CHAR_CLASS[36] = _CH_DOLLAR # '$'
+_CHAR_CLASS[44] = _CH_COMMA # ','
+_CHAR_CLASS[42] = _CH_STAR # '*'
 
 
 class MicropyGPS(object):
@@ -52,11 +133,10 @@ class MicropyGPS(object):
                     'S', 'SSW', 'SW', 'WSW', 'W','WNW', 'NW', 'NNW')
     __MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 
                 'July', 'August', 'September', 'October', 'November', 'December')
-    CLEAR_DATE = (0, 0, 0)
-    CLEAR_TIME = (0, 0, 0.0)
-    CLEAR_LAT = (0, 0.0, 'N')
-    CLEAR_LON = (0, 0.0, 'W')
-    __f_nan = float('nan')
+    CLEAR_DATE = _CLEAR_DATE
+    CLEAR_TIME = _CLEAR_TIME
+    CLEAR_LAT = _CLEAR_LAT
+    CLEAR_LON = _CLEAR_LON
 
     def __init__(self, local_offset=0, location_formatting='ddm', century=None):
         """
@@ -76,9 +156,13 @@ class MicropyGPS(object):
         self.active_segment = 0
         self.process_crc = False
         self.gps_segments = []
-        self.__buf = bytearray() # Buffer for update()
-        self.__buf_append = self.__buf.append
+        # Fixed buffer of the sentence, segments separated by ',' and CRC after the last one, filled up to __buf_pos
+        self.__buf = bytearray(self.SENTENCE_LIMIT + 2)
+        self.__buf_pos = 0
+        self.__seg_start = 0 # Start of the active segment in __buf
+        self.__parser = None # Parser of the active sentence from supported_sentences, None if unsupported
         self.crc_xor = 0
+        self.__crc = array('I', [0]) # crc_xor for _scan_segment()
         self.char_count = 0
         self.fix_time = 0
 
@@ -92,23 +176,25 @@ class MicropyGPS(object):
         # Logging Related
         self.log_handle = None
         self.log_en = False
+        self.__log_buf = bytearray() # Characters to be logged, written line by line
         self.log_filename = ''
         self.log_filemode = ''
 
         #####################
         # Data From Sentences
         # Time and Date
-        self.timestamp = self.CLEAR_TIME
-        self.date = self.CLEAR_DATE
+        self.timestamp = _CLEAR_TIME
+        self.date = _CLEAR_DATE
         self.century = century
         self.local_offset = local_offset
 
         # Position/Motion
-        self._latitude = self.CLEAR_LAT
-        self._longitude = self.CLEAR_LON
+        self._latitude = _CLEAR_LAT
+        self._longitude = _CLEAR_LON
         self.coord_format = location_formatting
         self.speed = 0.0
         self.course = 0.0
+        self._course_decideg = 0 # Course in tenths of degree (int), for compass_direction()
         self.altitude = 0.0
         self.geoid_height = 0.0
 
@@ -118,10 +204,14 @@ class MicropyGPS(object):
         self.satellites_used = []
         self.last_sv_sentence = 0
         self.total_sv_sentences = 0
-        self.satellite_data = dict()
-        self.hdop = self.__f_nan
-        self.pdop = self.__f_nan
-        self.vdop = self.__f_nan
+        self._sv_ids = array('H') # Satellite data of GSV sentences, see satellite_data
+        self._sv_el = array('h')
+        self._sv_az = array('h')
+        self._sv_snr = array('h')
+        self._sv_count = 0
+        self.hdop = _NAN
+        self.pdop = _NAN
+        self.vdop = _NAN
         self.valid = False
         self.fix_stat = 0 # Fix not available
         self.fix_type = self.__NO_FIX
@@ -146,8 +236,7 @@ class MicropyGPS(object):
         """
         if self.coord_format == 'dd':
             decimal_degrees = lat_lon[0] + (lat_lon[1] / 60)
-            sign_dd = (lat_lon[2] in 'NE') - (lat_lon[2] in 'SW')
-            return sign_dd * decimal_degrees
+            return _HEMI_SIGN.get(lat_lon[2], 0) * decimal_degrees
         elif self.coord_format == 'dms':
             return (
                 lat_lon[0], # degrees
@@ -173,11 +262,13 @@ class MicropyGPS(object):
             print("Invalid FileName")
             return False
         self.log_filename = target_file
+        self.__log_buf[:] = b''
         self.log_en = True
         return True
 
     def stop_logging(self):
         """Closes the log file handler and disables further logging"""
+        self.__flush_log()
         try:
             self.log_handle.close()
         except AttributeError:
@@ -188,14 +279,19 @@ class MicropyGPS(object):
         return True
 
     def write_log(self, log_string):
-        """Attempts to write the last valid NMEA sentence character to the active file handler"""
+        """Attempts to write NMEA sentence characters to the active file handler"""
         try:
-            with open(self.log_filename, 'a') as f:
-                f.write(log_string)
-        except TypeError:
+            self.log_handle.write(log_string)
+        except (AttributeError, TypeError):
             return False
         return True
 
+    def __flush_log(self):
+        """Writes the buffered characters to log file"""
+        if self.__log_buf:
+            self.write_log(self.__log_buf.decode('ascii'))
+            self.__log_buf[:] = b''
+
     ########################################
     # Sentence parsers
     ########################################
@@ -212,14 +308,18 @@ class MicropyGPS(object):
 
         # UTC timestamp
         if not utc_string:
-            self.timestamp = self.CLEAR_TIME
+            self.timestamp = _CLEAR_TIME
             return True
 
         # Possible timestamp found, HHMMSS[.SSSSSS]
         try:
+            if len(utc_string) == 6 and utc_string.isdigit():
+                # Fast path of HHMMSS, integers only
+                seconds = float(int(utc_string[4:6]))
+            else:
+                seconds = float(utc_string[4:])
             hours = (int(utc_string[0:2]) + self.local_offset) % 24
             minutes = int(utc_string[2:4])
-            seconds = float(utc_string[4:])
 
         except ValueError:  # Bad timestamp value present
             return False
@@ -263,72 +363,63 @@ class MicropyGPS(object):
         Updates UTC timestamp, latitude, longitude, course, speed, date, and fix status
         """
 
-        # Check receiver data valid flag
+        # A bad value in any segment fails the sentence, caught at once
         try:
-            status = self.gps_segments[2]
-        except IndexError:
-            return False
-        if status == 'A':  # Data from receiver is Valid/Has Fix
+            # Segments are unpacked at once
+            (_, utc_string, status, lat_str, lat_hemi, lon_str, lon_hemi,
+             spd_string, course_string, date_string, *_) = self.gps_segments
 
-            # UTC timestamp
-            if not self.__parse_time(self.gps_segments[1]):
-                return False
+            # Check receiver data valid flag
+            if status == 'A':  # Data from receiver is Valid/Has Fix
 
-            # Date stamp
-            try:
-                date_string = self.gps_segments[9]
+                # UTC timestamp
+                if not self.__parse_time(utc_string):
+                    return False
+
+                # Date stamp
                 if date_string:  # Possible date stamp found
-                    day = int(date_string[0:2])
-                    month = int(date_string[2:4])
-                    year = int(date_string[4:6])
-                    self.date = (day, month, year)
+                    self.date = (int(date_string[0:2]), int(date_string[2:4]), int(date_string[4:6])) # (DD, MM, YY)
                 else:  # No Date stamp yet
-                    self.date = self.CLEAR_DATE
-            except (ValueError, IndexError):  # Bad date stamp value present
-                return False
+                    self.date = _CLEAR_DATE
 
-            # Latitude and Longitude 
-            if not self.__parse_lat_lon(
-                self.gps_segments[3], # latitude in 'DDMM.MMMM' format
-                self.gps_segments[4], # hemisphere in 'N', 'S' 
-                self.gps_segments[5], # longitude in 'DDDMM.MMMM' format
-                self.gps_segments[6], # hemisphere in 'E', 'W'
-            ): return False
+                # Latitude and Longitude 
+                if not self.__parse_lat_lon(
+                    lat_str, # latitude in 'DDMM.MMMM' format
+                    lat_hemi, # hemisphere in 'N', 'S' 
+                    lon_str, # longitude in 'DDDMM.MMMM' format
+                    lon_hemi, # hemisphere in 'E', 'W'
+                ): return False
 
-            # Speed in knots
-            try:
-                spd_knt = float(self.gps_segments[7])
-            except ValueError:
-                return False
+                # Speed in knots
+                spd_knt = float(spd_string)
 
-            # Course in degrees
-            if not self.gps_segments[8]:
-                course = 0.0
-            else:
-                try:
-                    course = float(self.gps_segments[8])
-                except ValueError:
-                    return False
+                # Course in degrees
+                course = float(course_string) if course_string else 0.0
 
-            # TODO - Add magnetic variation
+                # TODO - Add magnetic variation
 
-            # Update object data
-            self.speed = spd_knt
-            self.course = course
-            self.valid = True
+                # Update object data
+                self.speed = spd_knt
+                self.course = course
+                self._course_decideg = int(course * 10 + 0.5)
+                self.valid = True
 
-            # Update last fix time
-            self.new_fix_time()
+                # Update last fix time
+                self.new_fix_time()
 
-        else:
-            # Clear position data if sentence is 'Invalid'
-            self._latitude = self.CLEAR_LAT
-            self._longitude = self.CLEAR_LON
-            self.speed = 0.0
-            self.course = 0.0
-            self.valid = False
-            # Do we have to clear timestamp and date?
-            #return True # Should it be False?
+            else:
+                # Clear position data if sentence is 'Invalid'
+                self._latitude = _CLEAR_LAT
+                self._longitude = _CLEAR_LON
+                self.speed = 0.0
+                self.course = 0.0
+                self._course_decideg = 0
+                self.valid = False
+                # Do we have to clear timestamp and date?
+                #return True # Should it be False?
+
+        except ValueError:  # Bad segment value present
+            return False
 
         return True
 
@@ -364,8 +455,8 @@ class MicropyGPS(object):
             self.new_fix_time()
 
         else:  # Clear position data if sentence is 'Invalid'
-            self._latitude = self.CLEAR_LAT
-            self._longitude = self.CLEAR_LON
+            self._latitude = _CLEAR_LAT
+            self._longitude = _CLEAR_LON
             self.valid = False
             # Do we have to clear timestamp and date?
             #return True # Should it be False?
@@ -386,6 +477,7 @@ class MicropyGPS(object):
         # Update object data
         self.speed = spd_knt
         self.course = course
+        self._course_decideg = int(course * 10 + 0.5)
         return True
 
     def gpgga(self):
@@ -396,38 +488,41 @@ class MicropyGPS(object):
         """
 
         try:
+            # Segments are unpacked at once
+            (_, utc_string, lat_str, lat_hemi, lon_str, lon_hemi, fix_string, sats_string,
+             hdop_string, alt_string, _, geoid_string, *_) = self.gps_segments
             # Number of satellites in use
-            satellites_in_use = int(self.gps_segments[7])
+            satellites_in_use = int(sats_string)
             # Get fix status
-            fix_stat = int(self.gps_segments[6])
-        except (ValueError, IndexError):
+            fix_stat = int(fix_string)
+        except ValueError:
             return False
 
         # UTC timestamp
-        if not self.__parse_time(self.gps_segments[1]):
+        if not self.__parse_time(utc_string):
             return False
 
         try:
             # Horizontal dilution of precision
-            hdop = float(self.gps_segments[8])
-        except (ValueError, IndexError):
-            hdop = self.__f_nan
+            hdop = float(hdop_string)
+        except ValueError:
+            hdop = _NAN
 
         # Process location data if fix is GOOD
         if fix_stat:
 
             # Latitude and Longitude
             if not self.__parse_lat_lon(
-                self.gps_segments[2], # latitude in 'DDMM.MMMM' format
-                self.gps_segments[3], # hemisphere in 'N', 'S' 
-                self.gps_segments[4], # longitude in 'DDDMM.MMMM' format
-                self.gps_segments[5], # hemisphere in 'E', 'W'
+                lat_str, # latitude in 'DDMM.MMMM' format
+                lat_hemi, # hemisphere in 'N', 'S' 
+                lon_str, # longitude in 'DDDMM.MMMM' format
+                lon_hemi, # hemisphere in 'E', 'W'
             ): return False
 
             # Altitude / Height Above Geoid
             try:
-                altitude = float(self.gps_segments[9])
-                geoid_height = float(self.gps_segments[11])
+                altitude = float(alt_string)
+                geoid_height = float(geoid_string)
             except ValueError:
                 altitude = 0.0
                 geoid_height = 0.0
@@ -453,31 +548,24 @@ class MicropyGPS(object):
         Dilution of Precision, and fix status
         """
 
-        # Fix type (None,2D or 3D)
+        # A bad value in any segment fails the sentence, caught at once
+        segments = self.gps_segments
         try:
-            fix_type = int(self.gps_segments[2])
-        except ValueError:
-            return False
-
-        # Read All (up to 12) Available PRN Satellite Numbers
-        sats_used = []
-        for sats in range(12):
-            sat_number_str = self.gps_segments[3 + sats]
-            if sat_number_str:
-                try:
-                    sat_number = int(sat_number_str)
-                    sats_used.append(sat_number)
-                except ValueError:
-                    return False
-            else:
-                break
-
-        # PDOP,HDOP,VDOP
-        try:
-            pdop = float(self.gps_segments[15])
-            hdop = float(self.gps_segments[16])
-            vdop = float(self.gps_segments[17])
-        except ValueError:
+            # Fix type (None,2D or 3D), PDOP, HDOP and VDOP segments are unpacked at once
+            fix_type = int(segments[2])
+            pdop_string, hdop_string, vdop_string = segments[15:18]
+
+            # Read All (up to 12) Available PRN Satellite Numbers, up to the first empty segment
+            prn_strings = segments[3:15]
+            if '' in prn_strings:
+                prn_strings = prn_strings[:prn_strings.index('')]
+            sats_used = [int(prn) for prn in prn_strings]
+
+            # PDOP,HDOP,VDOP
+            pdop = float(pdop_string)
+            hdop = float(hdop_string)
+            vdop = float(vdop_string)
+        except (ValueError, IndexError):
             return False
 
         # If fix is GOOD, update fix timestamp
@@ -506,9 +594,17 @@ class MicropyGPS(object):
         except ValueError:
             return False
 
-        # Create a blank dict to store all the satellite data from this sentence in:
-        # satellite PRN is key, tuple containing telemetry is value
-        satellite_dict = dict()
+        # Satellite data is stored in arrays of PRN, elevation, azimuth and SNR without a tuple per satellite.
+        # Data from this sentence is written after the current data, None (no value) is stored as _SV_NONE
+        sv_ids, sv_el, sv_az, sv_snr = self._sv_ids, self._sv_el, self._sv_az, self._sv_snr
+        base = n = self._sv_count
+        if len(sv_ids) < base + 4:
+            # array.extend() of MicroPython takes no tuple, grown by append()
+            for sv in (sv_ids, sv_el, sv_az, sv_snr):
+                sv.append(0)
+                sv.append(0)
+                sv.append(0)
+                sv.append(0)
 
         # Calculate number of satelites to pull data for and thus how many segment positions to read
         if num_sv_sentences == current_sv_sentence:
@@ -529,26 +625,25 @@ class MicropyGPS(object):
 
             # If a PRN is present, grab satellite data
             try:
-                sat_id = int(self.gps_segments[sats])
-            except (ValueError, IndexError):
+                sv_ids[n] = int(self.gps_segments[sats])
+            except (ValueError, IndexError, OverflowError):
                 return False
 
             try:  # Elevation can be null (no value) when not tracking
-                elevation = int(self.gps_segments[sats+1])
-            except (ValueError, IndexError):
-                elevation = None
+                sv_el[n] = int(self.gps_segments[sats+1])
+            except (ValueError, IndexError, OverflowError):
+                sv_el[n] = _SV_NONE
 
             try:  # Azimuth can be null (no value) when not tracking
-                azimuth = int(self.gps_segments[sats+2])
-            except (ValueError, IndexError):
-                azimuth = None
+                sv_az[n] = int(self.gps_segments[sats+2])
+            except (ValueError, IndexError, OverflowError):
+                sv_az[n] = _SV_NONE
 
             try:  # SNR can be null (no value) when not tracking
-                snr = int(self.gps_segments[sats+3])
-            except (ValueError, IndexError):
-                snr = None
-            # Add satellite data to satellite_dict
-            satellite_dict[sat_id] = (elevation, azimuth, snr)
+                sv_snr[n] = int(self.gps_segments[sats+3])
+            except (ValueError, IndexError, OverflowError):
+                sv_snr[n] = _SV_NONE
+            n += 1
 
         # Update object data
         self.total_sv_sentences = num_sv_sentences
@@ -556,14 +651,36 @@ class MicropyGPS(object):
         self.satellites_in_view = sats_in_view
 
         # For a new set of sentences, we either clear out the existing sat data or
-        # update it as additional SV sentences are parsed
-        if current_sv_sentence == 1:
-            self.satellite_data = satellite_dict
-        else:
-            self.satellite_data.update(satellite_dict)
+        # update it as additional SV sentences are parsed.  Data of the same PRN is overwritten.
+        count = 0 if current_sv_sentence == 1 else base
+        for i in range(base, n):
+            sat_id = sv_ids[i]
+            j = 0
+            while j < count and sv_ids[j] != sat_id:
+                j += 1
+            if j == count:
+                count += 1
+            if j != i:
+                sv_ids[j], sv_el[j], sv_az[j], sv_snr[j] = sat_id, sv_el[i], sv_az[i], sv_snr[i]
+        self._sv_count = count
 
         return True
 
+    @property
+    def satellite_data(self):
+        """
+        Satellite data (dict) of the last set of GSV sentences.  Satellite PRN is key, tuple containing
+        telemetry (elevation, azimuth, snr) is value; None if not tracking.  Built from the arrays on each access.
+        """
+
+        sv_ids, sv_el, sv_az, sv_snr = self._sv_ids, self._sv_el, self._sv_az, self._sv_snr
+        satellite_dict = dict()
+        for i in range(self._sv_count):
+            el, az, snr = sv_el[i], sv_az[i], sv_snr[i]
+            satellite_dict[sv_ids[i]] = (None if el == _SV_NONE else el, None if az == _SV_NONE else az,
+                                         None if snr == _SV_NONE else snr)
+        return satellite_dict
+
     def gpzda(self):
         """
         Parse GPZDA sentence. Updates UTC timestamp, date and century.
@@ -577,7 +694,7 @@ class MicropyGPS(object):
             century, year = int(str_year[0:2]), int(str_year[2:4])
 
         except (ValueError, IndexError):  # Bad Date stamp value present
-            self.date = self.CLEAR_DATE
+            self.date = _CLEAR_DATE
             return False
 
         # UTC timestamp
@@ -602,86 +719,275 @@ class MicropyGPS(object):
         self.sentence_active = True
         self.process_crc = True
         self.char_count = 0
-        self.__buf[:] = b''
-
-    def __update_segment(self):
-        self.gps_segments.append(self.__buf.decode('ascii'))
-        self.__buf[:] = b''
+        self.__buf_pos = 0
+        self.__seg_start = 0
+        self.__parser = None
+
+    @staticmethod
+    @micropython.native
+    def _nmea_xor(buf):
+        """XOR of all bytes in buf (bytes-like), used for NMEA checksum"""
+        acc = 0
+        for c in buf:
+            acc ^= c
+        return acc
+
+    def __end_segment(self, comma):
+        """
+        End the active segment at ',' (comma is True) or '*'.  Segments stay in the buffer and are decoded
+        at once when the sentence is complete, only the header (1st segment) is decoded here and its parser
+        is looked up.
+        """
+        buf_pos = self.__buf_pos
+        if not self.active_segment:
+            header = self.__buf[:buf_pos].decode('ascii')
+            self.gps_segments.append(header)
+            self.__parser = self.supported_sentences.get(header)
+        if comma:
+            self.__buf[buf_pos] = 44
+            buf_pos += 1
+            self.__buf_pos = buf_pos
+        self.__seg_start = buf_pos
+        self.active_segment += 1
+
+    def __complete_sentence(self, buf, pos, body_end, crc_pos):
+        """
+        Check CRC of the sentence in buf, of which segments are buf[pos:body_end] and 2 CRC characters are
+        at crc_pos, then parse it if supported.  crc_xor and the parser of the header must be ready.
+        Returns sentence type on successful parse, None otherwise
+        """
+        self.sentence_active = False  # Clear active processing flag
+
+        # Check CRC errors, 2 hex digits in the buffer are decoded by table lookup
+        crc_hi = _HEX_DIGITS[buf[crc_pos]]
+        crc_lo = _HEX_DIGITS[buf[crc_pos + 1]]
+        if crc_hi == 0xFF or crc_lo == 0xFF:
+            # CRC Value was deformed and could not have been correct
+            return None
+        if self.crc_xor != (crc_hi << 4) | crc_lo:
+            self.crc_fails += 1
+            return None
+        # Decode all segments at once, followed by CRC segment
+        segments = buf[pos:body_end].decode('ascii').split(',')
+        segments.append(buf[crc_pos:crc_pos + 2].decode('ascii'))
+        self.gps_segments[:] = segments
+        self.clean_sentences += 1  # Increment clean sentences received
+
+        # If the valid sentence is a supported sentence type, then parse it!!
+        # Parse the sentence based on the message type, receive True if parse is clean
+        parser = self.__parser
+        if parser is not None and parser(self):
+            # Let host know that the GPS object was updated by returning parsed sentence type
+            self.parsed_sentences += 1
+            return self.gps_segments[0]
+        return None
 
+    def __whole_sentence(self, data, pos, star):
+        """
+        Parse a sentence received at once in data, of which segments data[pos:star] are followed by '*' and
+        2 CRC characters.  The filters of update() are applied, then the segments are checked and split at once.
+        Returns sentence type on successful parse, None otherwise
+        """
+        comma = _find_byte(data, 44, pos, star) # ','
+        try:
+            header = data[pos:star if comma < 0 else comma].decode('ascii')
+            parser = self.supported_sentences.get(header)
+            # The sentence and '*' counted as in update()
+            self.char_count = star - pos + 3
+            # Same bound as update(), which drops the sentence at the 1st CRC char over SENTENCE_LIMIT
+            if parser is None or star - pos + 2 > self.SENTENCE_LIMIT:
+                return None
+            self.__parser = parser
+            self.crc_xor = self._nmea_xor(data[pos:star])
+            self.process_crc = False
+            return self.__complete_sentence(data, pos, star, star + 1)
+        except UnicodeError:
+            # Non ASCII bytes in the sentence
+            return None
+
+    @micropython.native
     def update(self, new_char):
         """
         Process a new input char and updates GPS object if necessary based on special characters ('$', ',', '*')
         Function builds a list of received string that are validated by CRC prior to parsing by the appropriate
         sentence function.  Returns sentence type (e.g. 'GPRMC') on successful parse, None otherwise
+            new_char (str or int): A character, or a byte value as yielded by iterating over bytes read from UART.
         """
 
-        # Validate new_char is a printable char. cf. SP := 0x20 = 32, LF := 0x0a = 10, CR := 0x0d = 13.
-        ascii_char = ord(new_char)
-        if 32 <= ascii_char <= 126 or ascii_char in (10, 13):
+        # Validate new_char is a printable char, and classify it by table lookup.
+        ascii_char = new_char if isinstance(new_char, int) else ord(new_char)
+        char_class = _CHAR_CLASS[ascii_char] if ascii_char < 128 else 0
+        if char_class:
             self.char_count += 1
 
-            # Write character to log file if enabled
+            # Buffer character for log file if enabled, written at the end of line (LF) or every 256 chars
             if self.log_en:
-                self.write_log(new_char)
+                log_buf = self.__log_buf
+                log_buf.append(ascii_char)
+                if ascii_char == 10 or len(log_buf) >= 256:
+                    self.__flush_log()
 
             # Check if a new sentence is starting ($)
-            if ascii_char == 36: # '$' 36 = 0x24
+            if char_class == _CH_DOLLAR:
                 self.new_sentence()
 
             elif self.sentence_active:
 
+                # Store all other printable character and check CRC when ready
+                # Characters after '*' are all stored as CRC
+                if char_class == _CH_TEXT or not self.process_crc:
+                    buf_pos = self.__buf_pos
+                    self.__buf[buf_pos] = ascii_char
+                    self.__buf_pos = buf_pos + 1
+
+                    # When CRC input is disabled sentence is nearly complete, additional 2 bytes necessary for CRC.
+                    if not self.process_crc and buf_pos + 1 - self.__seg_start == 2:
+                        return self.__complete_sentence(self.__buf, 0, self.__seg_start, self.__seg_start)
+
                 # Check if the active segment is ended (,), create a new segment to feed characters to
-                if ascii_char == 44: # ',' 44 = 0x2c
-                    self.__update_segment()
-                    self.active_segment += 1
+                elif char_class == _CH_COMMA:
+                    # Update CRC with the segment and ',' (between the starting '$' and the ending '*' marks)
+                    self.crc_xor ^= self._nmea_xor(self.__buf[self.__seg_start:self.__buf_pos]) ^ 44
+                    self.__end_segment(True)
 
                 # Check if the sentence is almost ending (*), CRC (2 bytes) follows
-                elif ascii_char == 42: # '*' 42 = 0x2a
+                else:
+                    self.crc_xor ^= self._nmea_xor(self.__buf[self.__seg_start:self.__buf_pos])
                     self.process_crc = False
-                    self.__update_segment()
-                    self.active_segment += 1
+                    self.__end_segment(False)
                     return None
 
-                # Store all other printable character and check CRC when ready
-                else:
-                    self.__buf_append(ascii_char)
-
-                # Update CRC (between the starting '$' and the ending '*' marks, excluding the marks.)
-                if self.process_crc:
-                    self.crc_xor ^= ascii_char
-
-                # When CRC input is disabled sentence is nearly complete, additional 2 bytes necessary for CRC.
-                elif len(self.__buf) == 2:
-                    self.sentence_active = False  # Clear active processing flag
-                    self.__update_segment() # Update CRC segment
-
-                    try: # Check CRC errors
-                        if self.crc_xor != int(self.gps_segments[self.active_segment], 16):
-                            self.crc_fails += 1
-                            return None
-                    except ValueError:
-                        # CRC Value was deformed and could not have been correct
-                        return None
-                    self.clean_sentences += 1  # Increment clean sentences received
-
-                    # If the valid sentence is a supported sentence type, then parse it!!
-                    if (self.gps_segments[0] in self.supported_sentences
-                        and self.supported_sentences[self.gps_segments[0]](self)):
-                    # Parse the sentence based on the message type, receive True if parse is clean
-                        # Let host know that the GPS object was updated by returning parsed sentence type
-                        self.parsed_sentences += 1
-                        return self.gps_segments[0]
-
                 # Avoid unsupported sentences to be processed. Can be controlled by supported_sentences (dict).
                 # Also check that the sentence buffer isn't filling up with garbage waiting for the sentence 
                 # to complete.
-                if (self.active_segment == 1 and self.gps_segments[0] not in self.supported_sentences
+                if (self.active_segment == 1 and self.__parser is None
                     or self.char_count > self.SENTENCE_LIMIT):
                     self.sentence_active = False
 
         # Tell host no new sentence was parsed
         return None
 
+    @micropython.native
+    def update_bytes(self, data, end=None):
+        """
+        Process a chunk of received bytes (bytes, bytearray or memoryview) at once, data[:end] if end is given.
+        Same as calling update() for each byte, but segments between the special characters ('$', ',', '*') are
+        located by bytes.find() or Viper scanners on MicroPython, and processed a slice at a time.  Sentences may be
+        split across chunks, and mixed with update() calls.
+        A sentence received whole in data is checked and split into segments at once.
+        Unlike update(), bytes other than printable chars are not skipped; such sentence fails CRC check.
+        Returns the type of the last successfully parsed sentence in data, None otherwise
+        """
+
+        if end is None:
+            end = len(data)
+        # Logging is done char by char in update()
+        if self.log_en:
+            parsed = None
+            for b in memoryview(data)[:end]:
+                parsed = self.update(b) or parsed
+            return parsed
+
+        # bytes and bytearray (e.g. a preallocated read buffer) are scanned in place, others are copied
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data[:end])
+        parsed = None
+        pos = 0
+        # Attributes used in the loop are held in locals, sentence state is written back before leaving it
+        find = _find_byte
+        buf = self.__buf
+        crc = self.__crc
+        end_segment = self.__end_segment
+        sentence_limit = self.SENTENCE_LIMIT
+        while pos < end:
+            start = find(data, 36, pos, end) # '$'
+            if not self.sentence_active:
+                if start < 0:
+                    break
+                pos = start + 1
+                start = find(data, 36, pos, end)
+                limit = end if start < 0 else start
+
+                # Whole sentence before the next '$', its segments are split at once
+                star = find(data, 42, pos, limit) # '*'
+                if 0 <= star and star + 3 <= limit:
+                    parsed = self.__whole_sentence(data, pos, star) or parsed
+                    pos = limit
+                    continue
+                self.new_sentence()
+
+            # Current sentence lasts until the next '$' at most
+            limit = end if start < 0 else start
+            active = True
+            process_crc = self.process_crc
+            crc_xor = self.crc_xor
+            char_count = self.char_count
+            try:
+                while pos < limit and active:
+                    if process_crc:
+                        # seg_end is limit if the segment continues to the next chunk
+                        crc[0] = crc_xor
+                        seg_end = _scan_segment(data, pos, limit, crc)
+                        crc_xor = crc[0]
+                        n = seg_end - pos
+                        if char_count + n > sentence_limit:
+                            # Garbage, which does not fit in the buffer
+                            active = False
+                            break
+                        buf_pos = self.__buf_pos
+                        buf[buf_pos:buf_pos + n] = data[pos:seg_end]
+                        self.__buf_pos = buf_pos + n
+                        char_count += n
+                        pos = seg_end
+                        if seg_end < limit:
+                            char_count += 1
+                            if data[seg_end] == 44: # ','
+                                crc_xor ^= 44
+                                end_segment(True)
+                            else: # '*', CRC (2 bytes) follows
+                                process_crc = False
+                                end_segment(False)
+                            pos += 1
+
+                        # Avoid unsupported sentences and garbage as update() does
+                        if (self.active_segment == 1 and self.__parser is None
+                            or char_count > sentence_limit):
+                            active = False
+
+                    else:
+                        # 2 bytes of CRC
+                        buf_pos = self.__buf_pos
+                        crc_len = buf_pos - self.__seg_start
+                        n = min(2 - crc_len, limit - pos)
+                        buf[buf_pos:buf_pos + n] = data[pos:pos+n]
+                        self.__buf_pos = buf_pos + n
+                        char_count += n
+                        pos += n
+                        if crc_len + n == 2:
+                            # Counted up to the 1st CRC char, where update() checks the limit at last
+                            if char_count - 1 > sentence_limit:
+                                active = False
+                                break
+                            self.crc_xor = crc_xor
+                            self.char_count = char_count
+                            crc_pos = self.__seg_start
+                            parsed = self.__complete_sentence(buf, 0, crc_pos, crc_pos) or parsed
+                            active = False
+                        elif char_count > sentence_limit:
+                            active = False
+            except UnicodeError:
+                # Non ASCII bytes in the segment
+                active = False
+
+            # Next '$' restarts, drop the sentence if it is incomplete
+            self.sentence_active = active and start < 0
+            self.process_crc = process_crc
+            self.crc_xor = crc_xor
+            self.char_count = char_count
+            pos = limit
+
+        return parsed
+
     def new_fix_time(self):
         """
         Updates a high resolution counter with current time when fix is updated. 
@@ -719,7 +1025,7 @@ class MicropyGPS(object):
         :return: list
         """
 
-        return list(self.satellite_data.keys())
+        return list(self._sv_ids[:self._sv_count])
 
     def time_since_fix(self):
         """
@@ -727,17 +1033,8 @@ class MicropyGPS(object):
         Returns -1 if no fix has been found
         """
 
-        # Test if a Fix has been found
-        if self.fix_time == 0:
-            return -1
-
-        # Try calculating fix time using utime; if not running MicroPython
-        # time.time() returns a floating point value in secs
-        try:
-            current = utime.ticks_diff(get_ticks(), self.fix_time)
-        except NameError:
-            current = (get_ticks() - self.fix_time) * 1000  # ms
-        return current
+        # Test if a Fix has been found, ticks in milli seconds on both MicroPython and CPython
+        return ticks_diff(get_ticks(), self.fix_time) if self.fix_time else -1
 
     def compass_direction(self):
         """
@@ -745,10 +1042,9 @@ class MicropyGPS(object):
         :return: string
         """
 
-        # Calculate the offset for a rotated compass
-        offset_course = (self.course + 11.25) % 360.0
-        # Each compass point is separated by 22.5 degrees, divide to find lookup value
-        return self.__DIRECTIONS[int(offset_course // 22.5)]
+        # Each compass point is separated by 22.5 degrees (225 in 1/10 degrees), offset by half a point to round
+        # to the nearest one, and & 15 wraps around.  Doubled to keep the half point integer.
+        return self.__DIRECTIONS[((self._course_decideg * 2 + 225) // 450) & 15]
 
     def __pp_lat_lon(self, lat_lon):
         """
@@ -848,6 +1144,7 @@ class MicropyGPS(object):
                            'GNGGA': gpgga, 'GNRMC': gprmc,
                            'GNVTG': gpvtg, 'GNGLL': gpgll,
                            'GNGSA': gpgsa, 'GPZDA': gpzda,
+                           'GNGSV': gpgsv,
                           }
 
 if __name__ == "__main__":
@@ -1,193 +1,273 @@
-import time, collections, gc, asyncio
+import time, gc, asyncio
 from micropyGPS import MicropyGPS
 from machine import Pin, UART, I2C
-import machine
-import ssd1306
-import datetime
+import ssd1306, framebuf
 import micropython
 
 micropython.alloc_emergency_exception_buf(100)
 
 __str_array = const(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ') #For GridLocator Calc
 
-# Lock And EventFlag for asyncio
-gnss_newchar = asyncio.Event()
-readbuf_lock = asyncio.Lock()
-oled_lock = asyncio.Lock()
+# EventFlag for asyncio
 gnss_updatenow = asyncio.Event()
 pps_irq_flag = asyncio.ThreadSafeFlag()
+uart_rx_flag = asyncio.ThreadSafeFlag()
 
 #datetime service variables
-td_jst_wDelay = datetime.timedelta(hours=9, seconds=1) # add 1sec Delay for display
+days_in_month = const(b'\x1f\x1c\x1f\x1e\x1f\x1e\x1f\x1f\x1e\x1f\x1e\x1f')
+jst_str = bytearray(b'000000 00:00:00') # YYMMDD hh:mm:ss, rewritten by datetime_toJST
 
 # Running Mode Config
 config_atFirst = False
 uart_outputnmea = False
 
-#Tweak MicropyGPS GSV Parser
-MicropyGPS.supported_sentences['GNGSV'] = MicropyGPS.gpgsv
+# GNSS Reciever Config, sent at once when config_atFirst
+gnss_config_cmd = (
+    b'$PSTMCFGCONST,2,2,2,2,0*01\r\n' # Set Positioning Constelation to GPS+GLONASS+GALILEO+QZSS
+    b'$PSTMSBASSERVICE,15*6C\r\n' # Set SBAS Service Auto
+    b'$PSTMSTAGPSSETCONSTMASK,3*14\r\n' # Use STAGPS for GPS and GLONASS
+    b'$PSTMSTAGPSONOFF,1*4B\r\n' # Use STAGPS Autonomous AGPS
+    b'$PSTMSETPAR,1200,4,1*31\r\n' # Use SBAS Service
+    b'$PSTMSETPAR,1200,80000,1*3D\r\n' # GSV sentence talker ID change to GN Only
+    b'$PSTMSAVEPAR*58\r\n' # Save Parameters
+    b'$PSTMSRR*49\r\n' # Software Reset
+)
 
 # Pin ISR for Syncronize to PPS signal
+@micropython.native
 def detectPPS(Pin):
     pps_irq_flag.set()
 
+# UART ISR, set when a burst of received bytes is over
+@micropython.native
+def detectRxIdle(uart):
+    uart_rx_flag.set()
+
 # Pin and IRQ setting
 gnss_resetn = Pin(6, Pin.OUT)
 fix_led = Pin("LED", Pin.OUT)
 pps_pin = Pin(22, Pin.IN)
 pps_pin.irq(trigger=Pin.IRQ_RISING, handler=detectPPS)
 
-async def uart_readgnss(uart: UART,buf: collections.deque):
-    while True:
-        if uart.any():
-            s = uart.read()
-            if s is not None:
-                await readbuf_lock.acquire()
-                buf.extend(bytearray(s))
-                readbuf_lock.release()
-                gnss_newchar.set()
-                if uart_outputnmea:
-                    try:
-                        str_utf = str(s, 'UTF-8', "")
-                        print(str_utf, end="")
-                    except Exception as e:
-                        print(e)
-
-        await asyncio.sleep_ms(20)
-
-async def gnss_update(gnss: MicropyGPS, buf: collections.deque):
+async def uart_readgnss(uart: UART, gnss: MicropyGPS):
+    # Preallocated buffer, read into it instead of allocating bytes by uart.read()
+    rxbuf = bytearray(512)
+    rxbuf_mv = memoryview(rxbuf)
+    last_any = 0
+    # Wake up by RX idle interrupt if the port has it, polling otherwise
+    rx_irq = hasattr(UART, 'IRQ_RXIDLE')
+    if rx_irq:
+        uart.irq(handler=detectRxIdle, trigger=UART.IRQ_RXIDLE)
     while True:
-        await gnss_newchar.wait()
-        await readbuf_lock.acquire()
-        while len(buf) != 0:
-            gnss.update(chr(buf.popleft()))
-        gnss_updatenow.set()
-        gnss_newchar.clear()
-        readbuf_lock.release()
-
-def lat_lon_string(lat_lon):
-    min = "'"
+        n = uart.any()
+        if rx_irq:
+            if n == 0:
+                await uart_rx_flag.wait()
+                continue
+        # Wait for a full NMEA fragment, but don't hold back the tail of a burst once the line goes quiet
+        elif n < 64 and (n == 0 or n != last_any):
+            last_any = n
+            await asyncio.sleep_ms(10)
+            continue
+        last_any = 0
+        n = uart.readinto(rxbuf, min(n, len(rxbuf)))
+        if n:
+            # Parse received bytes at once, scanned in place without copy
+            timestamp = gnss.timestamp
+            gnss.update_bytes(rxbuf, n)
+            # Signal the display only when the position sentence (RMC/GGA) of a new second has been parsed
+            if gnss.timestamp != timestamp:
+                gnss_updatenow.set()
+            if uart_outputnmea:
+                try:
+                    str_utf = str(rxbuf_mv[:n], 'UTF-8', "")
+                    print(str_utf, end="")
+                except Exception as e:
+                    print(e)
+        await asyncio.sleep_ms(0)
+
+# Latitude and Longitude, digits are rewritten by lat_lon_string
+lat_str = bytearray(b"  0 00.000'N")
+lon_str = bytearray(b"  0 00.000'E")
+
+@micropython.native
+def lat_lon_fmt(out:bytearray, pos:int, d:int, dm_milli:int, hemi:int):
+    # write 'DDD MM.MMM'H' to out[pos:pos+12], leading zeros of degree are blank
+    out[pos] = 0x30 + d // 100 if d >= 100 else 0x20
+    out[pos+1] = 0x30 + d // 10 % 10 if d >= 10 else 0x20
+    out[pos+2] = 0x30 + d % 10
+    out[pos+4] = 0x30 + dm_milli // 10000
+    out[pos+5] = 0x30 + dm_milli // 1000 % 10
+    out[pos+7] = 0x30 + dm_milli // 100 % 10
+    out[pos+8] = 0x30 + dm_milli // 10 % 10
+    out[pos+9] = 0x30 + dm_milli % 10
+    out[pos+11] = hemi
+
+@micropython.native
+def lat_lon_string(lat_lon, out:bytearray):
     d, dm, hemi = lat_lon
-    return f'{d:3d} {dm:06.03f}{min}{hemi}'
+    lat_lon_fmt(out, 0, d, int(dm*1000 + 0.5), ord(hemi))
+    return out
 
 sg = bytearray(8)
+
+@micropython.viper
+def _gridlocator_kernel(sg: ptr8, lat_mm: int, lon_mm: int):
+    # lat_mm, lon_mm : latitude+90deg, longitude+180deg in 1/1000 minutes
+    sa = ptr8(__str_array)
+    sg[0] = sa[lon_mm // 1200000] # Field 20deg x 10deg
+    sg[1] = sa[lat_mm // 600000]
+    lon_mm = lon_mm % 1200000
+    lat_mm = lat_mm % 600000
+    sg[2] = lon_mm // 120000 + 0x30 # Square 2deg x 1deg
+    sg[3] = lat_mm // 60000 + 0x30
+    lon_mm = lon_mm % 120000
+    lat_mm = lat_mm % 60000
+    sg[4] = sa[lon_mm // 5000] # Subsquare 5min x 2.5min
+    sg[5] = sa[lat_mm // 2500]
+    lon_mm = lon_mm % 5000
+    lat_mm = lat_mm % 2500
+    sg[6] = lon_mm // 500 + 0x30 # Extended square 0.5min x 0.25min
+    sg[7] = lat_mm // 250 + 0x30
+
+@micropython.native
 def gridlocator_calc(lat, lon):
     d_lat, dm_lat, hemi = lat
     d_lon, dm_lon, hemi = lon
-    gf_lat = (d_lat + dm_lat/60 + 90)/10
-    gf_lon = (d_lon + dm_lon/60 + 180)/20
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[0] = __str_array[gf_lon_int]
-    sg[1] = __str_array[gf_lat_int]
-    gf_lat = (gf_lat - gf_lat_int)*10
-    gf_lon = (gf_lon - gf_lon_int)*10
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[2] = gf_lon_int + 0x30
-    sg[3] = gf_lat_int + 0x30
-    gf_lat = (gf_lat - gf_lat_int)*24
-    gf_lon = (gf_lon - gf_lon_int)*24
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[4] = __str_array[gf_lon_int]
-    sg[5] = __str_array[gf_lat_int]
-    gf_lat = (gf_lat - gf_lat_int)*10
-    gf_lon = (gf_lon - gf_lon_int)*10
-    gf_lat_int = int(gf_lat)
-    gf_lon_int = int(gf_lon)
-    sg[6] = gf_lon_int + 0x30
-    sg[7] = gf_lat_int + 0x30
+    # Viper kernel has no tuple/float support, convert to integer 1/1000 minutes here
+    _gridlocator_kernel(sg, (d_lat + 90)*60000 + int(dm_lat*1000), (d_lon + 180)*60000 + int(dm_lon*1000))
     #print(str(sg, 'UTF-8'))
     return sg
 
-def datetime_toJST(gnss_date:tuple[int,int,int], timestamp:tuple[int, int, float], offset:datetime.timedelta):
-    day = int(gnss_date[0])
-    month = int(gnss_date[1])
-    year = int(gnss_date[2])+2000
+@micropython.native
+def put_2digits(buf:bytearray, pos:int, value:int):
+    buf[pos] = 0x30 + value // 10
+    buf[pos+1] = 0x30 + value % 10
+
+@micropython.native
+def datetime_toJST(gnss_date:tuple[int,int,int], timestamp:tuple[int, int, float]):
+    # UTC+9h and 1sec Delay for display, without datetime objects
+    day, month, year = gnss_date
     hour, minutes, seconds = timestamp
-    #rtc.datetime((year, month, day, 0, hour, minutes, int(seconds), 0))
-    dt_now_jst = datetime.datetime(year, month, day, hour,minutes,int(seconds),0,datetime.timezone.utc)+offset
-    #print(dt_now_jst)
-    dateobj = dt_now_jst.date()
-    datestr = f'{dateobj.year-2000:02d}{dateobj.month:02d}{dateobj.day:02d}'
-    timeobj = dt_now_jst.time()
-    dt_now_jst_str = f'{datestr} {timeobj.hour:02d}:{timeobj.minute:02d}:{timeobj.second:02d}'
-    return dt_now_jst_str
+    seconds = int(seconds) + 1
+    if seconds == 60:
+        seconds = 0
+        minutes += 1
+        if minutes == 60:
+            minutes = 0
+            hour += 1
+    hour += 9
+    if hour >= 24:
+        hour -= 24
+        day += 1
+        if day > days_in_month[month-1] + (month == 2 and year % 4 == 0):
+            day = 1
+            month += 1
+            if month == 13:
+                month = 1
+                year = (year + 1) % 100
+    put_2digits(jst_str, 0, year)
+    put_2digits(jst_str, 2, month)
+    put_2digits(jst_str, 4, day)
+    put_2digits(jst_str, 7, hour)
+    put_2digits(jst_str, 10, minutes)
+    put_2digits(jst_str, 13, seconds)
+    return jst_str
+
+# Static labels, rendered once and copied into the OLED buffer every frame
+static_fb = bytearray(128 * 64 // 8)
+
+def render_static_labels():
+    fb = framebuf.FrameBuffer(static_fb, 128, 64, framebuf.MONO_VLSB)
+    fb.text('Lat:', 0, 0)
+    fb.text('Lon:', 0, 8)
+    fb.text('FIX:', 0, 24)
+    fb.text('Sat:', 56, 24)
+    fb.text('HDOP:', 0, 32)
+    fb.text('OK:', 0, 40)
+    fb.text('NG:', 0, 48)
 
 async def display_update(gnss: MicropyGPS, oled:ssd1306.SSD1306_I2C):
-    dt_now = '000000 00:00:00'
-    lat = '000 00.000''N'
-    lon = '000 00.000''E'
-    gl = b'XX00XX00'
+    # Rendering and show() in one coroutine, the OLED buffer is never touched concurrently
+    dt_now = jst_str
+    lat = str(lat_str, 'UTF-8')
+    lon = str(lon_str, 'UTF-8')
+    gl = 'XX00XX00'
+    last_pos = None
+    last_frame = None
+    no_fix = False
 
     fix_led.value(0)
     while True:
-        await gnss_updatenow.wait()
+        # Show the frame at PPS, it was rendered from the sentences of the previous second (+1sec in datetime_toJST)
+        try:
+            await asyncio.wait_for_ms(pps_irq_flag.wait(), 1100)
+        except asyncio.TimeoutError:
+            pass # No PPS without fix, keep updating at about 1Hz
+        oled.show()
+        # Render the next frame as soon as the time of the new second is parsed
+        gnss_updatenow.clear()
+        try:
+            await asyncio.wait_for_ms(gnss_updatenow.wait(), 900)
+        except asyncio.TimeoutError:
+            pass # No time without fix, render what has been received
+        gnss_updatenow.clear()
         if gnss.fix_type == 1:
             fix_led.toggle()
+            # Without fix, keep the frame drawn at entering no fix state, only the LED blinks
+            if no_fix:
+                continue
+            no_fix = True
         else:
             fix_led.value(1)
-            day = f'{gnss.date[0]:02d}'
-            month = f'{gnss.date[1]:02d}'
-            year = f'{gnss.date[2]:02d}'
-            date_str = f'{year}/{month}/{day}'
-            lat = lat_lon_string(gnss.latitude)
-            lon = lat_lon_string(gnss.longitude)
-            gl = gridlocator_calc(gnss.latitude, gnss.longitude)
-            dt_now = datetime_toJST(gnss.date,gnss.timestamp, td_jst_wDelay)
-        oled.fill(0)
+            no_fix = False
+        if gnss.fix_type != 1:
+            latitude = gnss.latitude
+            longitude = gnss.longitude
+            pos = (latitude, longitude)
+            # Position strings and grid locator only when the position moved
+            if pos != last_pos:
+                last_pos = pos
+                # framebuf.text() takes no bytearray, decoded once here instead of every frame
+                lat = str(lat_lon_string(latitude, lat_str), 'UTF-8')
+                lon = str(lat_lon_string(longitude, lon_str), 'UTF-8')
+                gl = str(gridlocator_calc(latitude, longitude), 'UTF-8')
+            dt_now = datetime_toJST(gnss.date,gnss.timestamp)
         #QZSS_prns = [x for x in gnss.satellites_used if x >= 184]
-        await oled_lock.acquire()
-        oled.text(f'Lat:{lat}', 0, 0)
-        oled.text(f'Lon:{lon}', 0, 8)
-        oled.text(dt_now, 8, 16)
-        oled.text(f'FIX:{gnss.fix_type}  Sat:{gnss.satellites_in_use:02d}/{gnss.satellites_in_view:02d}',0,24)
-        oled.text(f'HDOP:{gnss.hdop: 2.1f}',0,32)
-        oled.text(str(gl, 'UTF-8'), 32, 56)
-        oled.text(f'OK:{gnss.clean_sentences:13d}',0,40)
-        oled.text(f'NG:{gnss.crc_fails:13d}',0,48)
-        oled_lock.release()
-        gnss_updatenow.clear()
-        
-        #oled.show()
-        await asyncio.sleep_ms(500)
-
-async def display_sync(oled:ssd1306.SSD1306_I2C):
-    while True:
-        await pps_irq_flag.wait()
-        #state = machine.disable_irq()
-        await oled_lock.acquire()
-        oled.show()
-        oled_lock.release()
-        pps_irq_flag.clear()
-        #machine.enable_irq(state)
-
-async def gc_coro():
-    gc.enable()
-    while True:
-        gc.collect()
-        gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
-        print("mem_alloc:", gc.mem_alloc())
-        print("mem_free:", gc.mem_free())
-        #print("mem_info:")
-        #print(micropython.mem_info())
-        await asyncio.sleep(5)
+        # Lines other than the clock and the counters are redrawn only when their values have changed
+        hdop = gnss.hdop
+        frame = (lat, lon, gl, gnss.fix_type, gnss.satellites_in_use, gnss.satellites_in_view,
+                 -1 if hdop != hdop else int(hdop*10)) # hdop is NaN until a GGA or GSA has it
+        if frame != last_frame:
+            last_frame = frame
+            oled.buffer[:] = static_fb # Clear and put labels, only values are rendered below
+            oled.text(lat, 32, 0)
+            oled.text(lon, 32, 8)
+            oled.text(str(gnss.fix_type), 32, 24)
+            oled.text(f'{gnss.satellites_in_use:02d}/{gnss.satellites_in_view:02d}', 88, 24)
+            oled.text(f'{hdop: 2.1f}', 40, 32)
+            oled.text(gl, 32, 56)
+        else:
+            oled.fill_rect(0, 16, 128, 8, 0)
+            oled.fill_rect(24, 40, 104, 16, 0)
+        oled.text(str(dt_now, 'UTF-8'), 8, 16)
+        oled.text(f'{gnss.clean_sentences:13d}', 24, 40)
+        oled.text(f'{gnss.crc_fails:13d}', 24, 48)
 
 async def gnss_read(uart: UART, gnss: MicropyGPS):
     gc.collect()
+    gc.threshold(gc.mem_free() // 4 + gc.mem_alloc())
+    # for memory debug
+    #micropython.mem_info()
 
     i2c=I2C(1,sda=Pin(18),scl=Pin(19),freq=400000)
     oled=ssd1306.SSD1306_I2C(128,64,i2c)
+    render_static_labels()
 
-    buf = collections.deque('', 1024*4)
     uart.init(baudrate=9600, tx=Pin(0,Pin.OUT), rx=Pin(1, Pin.IN), timeout_char =16, rxbuf=1024*2)
     await asyncio.gather(
-        uart_readgnss(uart, buf),
-        gnss_update(gnss, buf),
-        display_update(gnss, oled),
-        display_sync(oled),
-        gc_coro()
+        uart_readgnss(uart, gnss),
+        display_update(gnss, oled)
     )
 
 
@@ -204,14 +284,7 @@ def main():
     gnss_reciever = MicropyGPS()
 
     if config_atFirst: 
-        uart.write('$PSTMCFGCONST,2,2,2,2,0*01\r\n') # Set Positioning Constelation to GPS+GLONASS+GALILEO+QZSS
-        uart.write('$PSTMSBASSERVICE,15*6C\r\n') # Set SBAS Service Auto
-        uart.write('$PSTMSTAGPSSETCONSTMASK,3*14\r\n') # Use STAGPS for GPS and GLONASS
-        uart.write('$PSTMSTAGPSONOFF,1*4B\r\n') # Use STAGPS Autonomous AGPS
-        uart.write('$PSTMSETPAR,1200,4,1*31\r\n') # Use SBAS Service
-        uart.write('$PSTMSETPAR,1200,80000,1*3D\r\n') # GSV sentence talker ID change to GN Only
-        uart.write('$PSTMSAVEPAR*58\r\n') # Save Parameters
-        uart.write('$PSTMSRR*49\r\n') # Software Reset
+        uart.write(gnss_config_cmd)
         time.sleep_ms(200)
         if uart.any():
             s = uart.read()